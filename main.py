@@ -9,20 +9,28 @@ Demonstrates:
 """
 
 import asyncio
+import functools
 import os
 import logging
+import time
+from collections.abc import Awaitable, Callable
+from urllib.parse import urlsplit, urlunsplit
 
 from dotenv import load_dotenv
 
 # Import the patched Puzzle client and related classes
 # The patch adds WebSocket subscription support to the base ariadne-codegen client
-from puzzle_client_patched import PuzzleClient
+from puzzle_client_patched import PuzzleClient, QueryCache
 from puzzle.exceptions import GraphQLClientHttpError
 from puzzle.get_projects import GetProjectsProjects
 
 # Configure logging to emit informational messages
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
 
+# Log with %-style arguments: messages are only formatted when the record
+# is actually emitted, which matters for per-update logging
+log = logging.getLogger("puzzle.reactor")
+
 
 class PuzzleReactor:
     """Handles interactions with the Puzzle API to react to events.
@@ -41,13 +49,34 @@ class PuzzleReactor:
         if not PUZZLE_API:
             raise ValueError("PUZZLE_API environment variable is not set.")
 
-        # Convert the HTTP URL to a WebSocket URL (http -> ws, /api/graphql -> /api/graphql/ws)
-        ws_url = PUZZLE_API.replace("http", "ws").replace(
-            "/api/graphql", "/api/graphql/ws"
+        ws_url = self.ws_url_for(PUZZLE_API)
+
+        # Create a client that supports both HTTP requests and WebSocket subscriptions.
+        # Query results are cached on disk between runs.
+        self.client = PuzzleClient(
+            url=PUZZLE_API, ws_url=ws_url, query_cache=QueryCache()
         )
 
-        # Create a client that supports both HTTP requests and WebSocket subscriptions
-        self.client = PuzzleClient(url=PUZZLE_API, ws_url=ws_url)
+    @staticmethod
+    @functools.cache
+    def ws_url_for(api_url: str) -> str:
+        """Converts the HTTP API URL to the WebSocket URL.
+
+        http -> ws, https -> wss, /api/graphql -> /api/graphql/ws.
+        Only the scheme and the path are rewritten.
+
+        Args:
+            api_url (str): The Puzzle GraphQL API URL.
+
+        Returns:
+            str: The Puzzle GraphQL WebSocket URL.
+        """
+        parts = urlsplit(api_url)
+        ws_scheme = "wss" if parts.scheme == "https" else "ws"
+        ws_path = parts.path.replace("/api/graphql", "/api/graphql/ws", 1)
+        return urlunsplit(
+            (ws_scheme, parts.netloc, ws_path, parts.query, parts.fragment)
+        )
 
     async def login(self):
         """Authenticates against the Puzzle API using a GraphQL mutation.
@@ -61,7 +90,7 @@ class PuzzleReactor:
 
         # Check that required credentials are present
         if username is None or password is None:
-            logging.error("Login failed: Missing credentials.")
+            log.error("Login failed: Missing credentials.")
             return False
 
         try:
@@ -75,13 +104,13 @@ class PuzzleReactor:
                 # After successful authentication the cookie will be saved
                 # to http_client.cookies and used for subsequent
                 # HTTP requests and WebSocket connections
-                logging.info("Login successful.")
+                log.info("Login successful.")
                 return True
             else:
-                logging.error("Login failed.")
+                log.error("Login failed.")
                 return False
         except GraphQLClientHttpError as e:
-            logging.error(f"Login failed: {e.response}")
+            log.error("Login failed: %s", e.response)
             return False
 
     async def fetch_projects(self) -> list[GetProjectsProjects]:
@@ -91,18 +120,16 @@ class PuzzleReactor:
             list[GetProjectsProjects]: A list of active projects (where done_at is None).
         """
         try:
-            response = await self.client.get_projects()
+            # Only active projects (not yet finished) are requested;
+            # the server filters out the rest
+            response = await self.client.get_projects(active=True)
             if response.projects:
-                # Filter only active projects (with done_at == None)
-                # These are projects that are not yet finished
-                active_projects = [p for p in response.projects if p.done_at is None]
-
-                return active_projects
+                return response.projects
             else:
-                logging.error("Failed to fetch projects.")
+                log.error("Failed to fetch projects.")
                 return []
         except GraphQLClientHttpError as e:
-            logging.error(f"Error fetching projects: {e.response}")
+            log.error("Error fetching projects: %s", e.response)
             return []
 
     async def run(self):
@@ -122,24 +149,72 @@ class PuzzleReactor:
         #
         # # Process fetched projects
         # for project in active_projects:
-        #     logging.info(f"Processing project: {project.title}")
+        #     log.info("Processing project: %s", project.title)
 
         # Create handlers for WebSocket subscriptions
         async def handle_projects():
             """Handle project update events coming through the WebSocket."""
-            async for projectUpdated in self.client.on_projects_updated():
-                logging.info(f"Project updated: {projectUpdated}")
+            async for projectUpdated in self.client.on_projects_updated_structs():
+                # Cached project lists are outdated now
+                self.client.invalidate_query("get_projects")
+                log.info("Project updated: %s", projectUpdated)
 
         async def handle_products():
             """Handle product update events coming through the WebSocket."""
-            async for productsUpdated in self.client.on_products_updated():
-                logging.info(f"Products updated: {productsUpdated}")
+            async for productsUpdated in self.client.on_products_updated_structs():
+                log.info("Products updated: %s", productsUpdated)
 
         # Run both subscriptions in parallel
-        # Both will listen concurrently and react to real-time events
-        await asyncio.gather(handle_projects(), handle_products())
+        # Both will listen concurrently and react to real-time events.
+        # Each handler is restarted on its own after a failure, so an error
+        # in one subscription doesn't cancel the other.
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._retry_forever(handle_projects))
+            tg.create_task(self._retry_forever(handle_products))
+
+    async def _retry_forever(
+        self,
+        handler: Callable[[], Awaitable[None]],
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        healthy_after: float = 60.0,
+    ):
+        """Runs a subscription handler, restarting it whenever it stops.
+
+        Failures are retried with exponential backoff; a subscription
+        that ended normally, or failed after running for a while, is
+        restarted after the initial delay.
+
+        Args:
+            handler (Callable[[], Awaitable[None]]): The subscription handler.
+            initial_backoff (float): Delay before the first retry, in seconds.
+            max_backoff (float): Upper bound for the retry delay, in seconds.
+            healthy_after (float): Run time, in seconds, after which a failure
+                no longer counts towards the backoff.
+        """
+        backoff = initial_backoff
+        while True:
+            started = time.monotonic()
+            try:
+                await handler()
+                backoff = initial_backoff
+            except Exception as e:
+                log.error("%s failed: %s", handler.__name__, e)
+                # A long healthy run followed by a drop is not a failure streak
+                if time.monotonic() - started >= healthy_after:
+                    backoff = initial_backoff
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+            else:
+                await asyncio.sleep(backoff)
 
 
 if __name__ == "__main__":
     app = PuzzleReactor()
-    asyncio.run(app.run())
+    # Prefer uvloop's faster event loop when it is available (not on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(app.run())
+    else:
+        uvloop.run(app.run())
@@ -5,26 +5,337 @@ This module extends the auto-generated puzzle.Client without modifying the gener
 It provides:
 - Cookie-based authentication support for HTTP and WebSocket connections
 - WebSocket compatibility with websockets 15.x library
+- A single shared WebSocket connection multiplexing all subscriptions
+- An optional on-disk cache for query results
+- Subscriptions decoded into msgspec Structs (see puzzle_structs)
 """
 
 # pyright: reportUnknownMemberType=false
 
-from collections.abc import AsyncIterator
-from typing import Any
+import asyncio
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+)
+from http.cookiejar import CookieJar
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, NoReturn, TypeVar, cast
 from uuid import uuid4
 
 import httpx
+import msgspec
+import orjson
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
 
 from puzzle.async_base_client import GRAPHQL_TRANSPORT_WS, GraphQLTransportWSMessageType
 from puzzle.client import Client
+from puzzle.exceptions import (
+    GraphQLClientError,
+    GraphQLClientGraphQLMultiError,
+    GraphQLClientInvalidMessageFormat,
+    GraphQLClientInvalidResponseError,
+)
+from puzzle.base_model import UNSET, UnsetType
+from puzzle.get_projects import GetProjects
+from puzzle.login import Login
+from puzzle_structs import OnProductsUpdated, OnProjectsUpdated
 
-try:
-    from websockets import connect as ws_connect
-    from websockets.typing import Subprotocol
-except ImportError:
-    raise ImportError(
-        "Subscriptions require 'websockets' package. Install with: pip install websockets"
-    )
+if TYPE_CHECKING:
+    from websockets import ClientConnection
+
+T = TypeVar("T")
+StructT = TypeVar("StructT", bound=msgspec.Struct)
+
+# Pre-serialized reply to server pings
+_PONG_FRAME = orjson.dumps({"type": GraphQLTransportWSMessageType.PONG.value})
+# A bare server ping, recognized without decoding the frame
+_PING_FRAME = orjson.dumps({"type": GraphQLTransportWSMessageType.PING.value})
+# A bare connection acknowledgment, recognized the same way
+_CONNECTION_ACK_FRAME = orjson.dumps(
+    {"type": GraphQLTransportWSMessageType.CONNECTION_ACK.value}
+)
+# Client completion of an operation, split around the operation id
+_COMPLETE_FRAME_HEAD, _COMPLETE_FRAME_TAIL = orjson.dumps(
+    {"id": "__ID__", "type": GraphQLTransportWSMessageType.COMPLETE.value}
+).split(b'"__ID__"')
+QueryMethodT = TypeVar(
+    "QueryMethodT", bound=Callable[..., Coroutine[Any, Any, BaseModel]]
+)
+# Statuses of servers that reject array bodies before executing anything
+_BATCH_REJECTED_STATUS_CODES = frozenset({400, 405, 415, 422})
+
+
+class _WSMessage(msgspec.Struct):
+    """A graphql-transport-ws frame, with its payload left undecoded."""
+
+    type: str
+    id: str | None = None
+    payload: msgspec.Raw = msgspec.Raw()
+
+
+class _NextPayload(msgspec.Struct, Generic[T]):
+    """The payload of a "next" frame."""
+
+    data: T | None
+
+
+_ws_message_decoder = msgspec.json.Decoder(_WSMessage)
+
+
+@functools.cache
+def _next_payload_decoder(data_type: Any) -> msgspec.json.Decoder[_NextPayload[Any]]:
+    return msgspec.json.Decoder(_NextPayload[data_type])
+
+
+class _CapturedSubscription(Exception):
+    """Carries the operation a generated subscription method executes."""
+
+    def __init__(self, query: str, operation_name: str | None) -> None:
+        super().__init__(operation_name)
+        self.query = query
+        self.operation_name = operation_name
+
+
+class _SubscriptionRecorder:
+    """Stands in for the client to capture a generated subscription's query."""
+
+    def execute_ws(
+        self,
+        query: str,
+        operation_name: str | None = None,
+        variables: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> NoReturn:
+        raise _CapturedSubscription(query, operation_name)
+
+
+@functools.cache
+def _generated_subscription(
+    method: Callable[..., AsyncIterator[Any]],
+) -> tuple[str, str | None]:
+    """
+    Return the query and operation name of a generated subscription method.
+
+    The generated client stays the single source of the query text: the
+    method is started with a stand-in client whose execute_ws() captures its
+    arguments before anything is sent.
+    """
+    updates = cast(AsyncGenerator[Any, None], method(_SubscriptionRecorder()))
+    try:
+        updates.asend(None).send(None)
+    except _CapturedSubscription as captured:
+        return captured.query, captured.operation_name
+    raise TypeError(f"{method.__qualname__} did not execute a subscription")
+
+
+class SubscriptionOverflowError(GraphQLClientError):
+    """Raised when a subscription's consumer falls too far behind its updates."""
+
+    def __init__(self, operation_id: str, limit: int) -> None:
+        self.operation_id = operation_id
+        self.limit = limit
+        super().__init__(
+            f"Subscription {operation_id} fell more than {limit} updates behind "
+            "and was completed"
+        )
+
+
+class QueryCache:
+    """
+    On-disk LRU cache for GraphQL query results.
+
+    Results are stored gzip-compressed in a SQLite database (WAL mode),
+    keyed by a hash of the API URL, the user, the operation and its arguments.
+    The default location is ~/.cache/puzzle-reactor/queries.sqlite; the
+    database is only opened when the cache is first used.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str] | None = None,
+        max_entries: int = 256,
+    ) -> None:
+        if path is None:
+            cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+            path = Path(cache_home) / "puzzle-reactor" / "queries.sqlite"
+
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._connection: sqlite3.Connection | None = None
+        # Access times of cache hits, written with the next put() or close()
+        self._accessed: dict[bytes, float] = {}
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queries (
+                    key BLOB PRIMARY KEY,
+                    operation TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    data BLOB NOT NULL
+                )
+                """
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS queries_operation ON queries (operation)"
+            )
+            db.commit()
+            self._connection = db
+        return self._connection
+
+    def get(self, key: bytes) -> tuple[bytes, float] | None:
+        """Return the cached (data, stored_at) for key, or None on a miss."""
+        row = self._db.execute(
+            "SELECT data, stored_at FROM queries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        # Hits only read; the LRU order is updated on the next write
+        self._accessed[key] = time.time()
+        return gzip.decompress(row[0]), row[1]
+
+    def put(self, key: bytes, operation: str, data: bytes) -> None:
+        """Store data for key, evicting the least recently used entries."""
+        now = time.time()
+        self._write_accessed()
+        self._db.execute(
+            "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+            (key, operation, now, now, gzip.compress(data)),
+        )
+        self._db.execute(
+            """
+            DELETE FROM queries WHERE key IN (
+                SELECT key FROM queries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def invalidate(self, operation: str) -> None:
+        """Drop all cached results of an operation."""
+        self._db.execute("DELETE FROM queries WHERE operation = ?", (operation,))
+        self._db.commit()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._write_accessed()
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def _write_accessed(self) -> None:
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE queries SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+
+def cached_query(
+    model: type[BaseModel],
+    ttl: float = 300.0,
+    stale_ttl: float = 3600.0,
+) -> Callable[[QueryMethodT], QueryMethodT]:
+    """
+    Cache the results of a PuzzleClient query method in its query_cache.
+
+    Results younger than `ttl` seconds are returned without a request. Older
+    results, up to `ttl + stale_ttl`, are returned immediately while a
+    background task refreshes them (stale-while-revalidate). Results are kept
+    per user: the id of the user logged in with login() is part of the cache
+    key. Without a query_cache on the client, or before login(), the method
+    is called directly.
+    """
+
+    def decorator(func: QueryMethodT) -> QueryMethodT:
+        operation = func.__name__
+
+        async def fetch(
+            client: "PuzzleClient", key: bytes, *args: Any, **kwargs: Any
+        ) -> BaseModel:
+            result = await func(client, *args, **kwargs)
+            if client.query_cache is not None:
+                client.query_cache.put(
+                    key,
+                    operation,
+                    orjson.dumps(result.model_dump(mode="json", by_alias=True)),
+                )
+            return result
+
+        async def revalidate(
+            client: "PuzzleClient", key: bytes, *args: Any, **kwargs: Any
+        ) -> None:
+            # Keep serving the stale result if the refresh fails; nobody awaits
+            # this task, so no error may escape it
+            with contextlib.suppress(Exception):
+                await fetch(client, key, *args, **kwargs)
+
+        @functools.wraps(func)
+        async def wrapper(
+            client: "PuzzleClient", *args: Any, **kwargs: Any
+        ) -> BaseModel:
+            # Results depend on who is logged in; without a known user they
+            # can't be shared safely
+            if client.query_cache is None or client.user_id is None:
+                return await func(client, *args, **kwargs)
+
+            # Drop results invalidated since the last call, once per burst
+            if operation in client._invalidated:
+                client._invalidated.discard(operation)
+                client.query_cache.invalidate(operation)
+
+            key = hashlib.blake2b(
+                orjson.dumps(
+                    [client.url, client.user_id, operation, args, kwargs],
+                    default=repr,
+                ),
+                digest_size=16,
+            ).digest()
+
+            cached = client.query_cache.get(key)
+            if cached is not None:
+                data, stored_at = cached
+                age = time.time() - stored_at
+                if age < ttl + stale_ttl:
+                    if age >= ttl and key not in client._revalidating:
+                        client._revalidating.add(key)
+                        task = asyncio.create_task(
+                            revalidate(client, key, *args, **kwargs)
+                        )
+                        # The event loop only keeps weak references to tasks
+                        client._revalidation_tasks.add(task)
+                        task.add_done_callback(client._revalidation_tasks.discard)
+                        task.add_done_callback(
+                            lambda _: client._revalidating.discard(key)
+                        )
+                    return model.model_validate(orjson.loads(data))
+
+            return await fetch(client, key, *args, **kwargs)
+
+        return cast(QueryMethodT, wrapper)
+
+    return decorator
 
 
 class PuzzleClient(Client):
@@ -35,8 +346,18 @@ class PuzzleClient(Client):
     - Enable cookie persistence for authentication
     - Extract cookies from HTTP client and pass them to WebSocket connections
     - Use websockets 15.x compatible API
+    - Share one WebSocket connection between all subscriptions
     """
 
+    # websockets.connect, imported on the first subscription
+    _ws_connect: ClassVar[Any] = None
+
+    # Serialized subscribe frames split around the operation id and the
+    # variables, keyed by (query, operation_name)
+    _subscribe_template_cache: ClassVar[
+        dict[tuple[str, str | None], tuple[bytes, bytes, bytes]]
+    ] = {}
+
     def __init__(
         self,
         url: str = "",
@@ -46,12 +367,24 @@ class PuzzleClient(Client):
         ws_headers: dict[str, Any] | None = None,
         ws_origin: str | None = None,
         ws_connection_init_payload: dict[str, Any] | None = None,
+        query_cache: QueryCache | None = None,
+        batch_window: float | None = None,
+        subscription_buffer: int = 256,
+        pipeline_subscribe: bool = False,
     ) -> None:
         # Initialize with a custom http_client that has cookie support if not provided
         if http_client is None:
             http_client = httpx.AsyncClient(
                 headers=headers,
                 cookies=httpx.Cookies(),  # Enable cookie jar
+                # One multiplexed HTTP/2 connection, kept alive between bursts
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=32,
+                    max_keepalive_connections=16,
+                    keepalive_expiry=300.0,
+                ),
+                timeout=httpx.Timeout(10.0, connect=5.0),
             )
 
         # Call parent constructor
@@ -65,66 +398,629 @@ class PuzzleClient(Client):
             ws_connection_init_payload=ws_connection_init_payload,
         )
 
-    async def execute_ws(
+        # Shared WebSocket connection state.
+        # All subscriptions are multiplexed over one graphql-transport-ws
+        # connection; incoming frames are routed to per-operation queues.
+        # Each operation remembers the connection it was subscribed on, so a
+        # dying connection only ends its own operations. At most
+        # subscription_buffer updates are queued per operation.
+        self.subscription_buffer = subscription_buffer
+        self._ws_lock = asyncio.Lock()
+        self._ws: "ClientConnection | None" = None
+        self._ws_demux: dict[
+            str,
+            tuple[
+                "ClientConnection",
+                asyncio.Queue[Any | Exception | None],
+                msgspec.json.Decoder[_NextPayload[Any]],
+            ],
+        ] = {}
+        self._ws_reader_task: asyncio.Task[None] | None = None
+        # Opt-in: send the first subscribe before CONNECTION_ACK until the
+        # server objects. Spec-compliant servers always do (see _ensure_ws).
+        self._ws_pipelining = pipeline_subscribe
+
+        # Memoized Cookie header for WebSocket handshakes.
+        # _cookie_version is bumped whenever an HTTP response sets cookies.
+        self._cookie_version = 0
+        self._cookie_header_key: tuple[CookieJar, int] | None = None
+        self._cookie_header = ""
+        self.http_client.event_hooks["response"].append(self._track_cookie_changes)
+
+        # Optional cache for query results (see cached_query), used once the
+        # logged-in user is known
+        self.query_cache = query_cache
+        self.user_id: str | None = None
+        self._revalidating: set[bytes] = set()
+        self._revalidation_tasks: set[asyncio.Task[None]] = set()
+        self._invalidated: set[str] = set()
+
+        # Query batching: None until the server is known to accept (True) or
+        # reject (False) array bodies. With batch_window set, queries issued
+        # within that many seconds of each other are sent as one batch.
+        self._batching_supported: bool | None = None
+        self.batch_window = batch_window
+        self._batch_pending: list[
+            tuple[
+                tuple[str, str | None, dict[str, Any]], asyncio.Future[httpx.Response]
+            ]
+        ] = []
+        self._batch_flush_task: asyncio.Task[None] | None = None
+
+    async def __aexit__(
         self,
-        query: str,
-        operation_name: str | None = None,
-        variables: dict[str, Any] | None = None,
+        exc_type: object,
+        exc_val: object,
+        exc_tb: object,
+    ) -> None:
+        await self.close_ws()
+        for task in list(self._revalidation_tasks):
+            task.cancel()
+        await asyncio.gather(*self._revalidation_tasks, return_exceptions=True)
+        await super().__aexit__(exc_type, exc_val, exc_tb)
+
+    async def close_ws(self) -> None:
+        """Close the shared WebSocket connection, ending all active subscriptions."""
+        websocket, reader_task = self._ws, self._ws_reader_task
+        self._ws = None
+        self._ws_reader_task = None
+
+        if websocket is not None:
+            await websocket.close()
+        if reader_task is not None:
+            await reader_task
+
+    async def login(
+        self,
+        username: str,
+        password: str,
+        domain_name: str | None | UnsetType = UNSET,
         **kwargs: Any,
-    ) -> AsyncIterator[dict[str, Any]]:
+    ) -> Login:
+        """Log in, remembering the user's id to keep cached results per user."""
+        response = await super().login(
+            username=username, password=password, domain_name=domain_name, **kwargs
+        )
+        self.user_id = response.login.id
+        return response
+
+    @cached_query(GetProjects)
+    async def get_projects(
+        self, active: bool | None | UnsetType = UNSET, **kwargs: Any
+    ) -> GetProjects:
+        return await super().get_projects(active=active, **kwargs)
+
+    def invalidate_query(self, operation: str) -> None:
         """
-        Execute a GraphQL subscription over WebSocket with cookie authentication.
+        Mark cached results of a query method, e.g. "get_projects", as outdated.
 
-        This method overrides the parent's execute_ws to:
-        1. Extract cookies from the HTTP client session
-        2. Include cookies in the WebSocket connection headers
-        3. Use 'additional_headers' parameter for websockets 15.x compatibility
+        This only sets an in-memory flag, so it is cheap to call for every
+        update; the results are dropped from the cache on the next call.
         """
-        headers = self.ws_headers.copy()
-        headers.update(kwargs.get("extra_headers", {}))
+        if self.query_cache is not None:
+            self._invalidated.add(operation)
 
-        # Extract cookies from HTTP client and add to WebSocket headers
-        if self.http_client.cookies:
-            cookie_header = "; ".join(
-                [
-                    f"{cookie.name}={cookie.value}"
-                    for cookie in self.http_client.cookies.jar
+    async def execute_batch(
+        self, operations: list[tuple[str, dict[str, Any] | None]]
+    ) -> list[dict[str, Any]]:
+        """
+        Execute several GraphQL operations in a single HTTP request.
+
+        Operations are (query, variables) pairs sent as a JSON array body.
+        Servers that don't support batching get the operations as separate
+        requests instead. Returns the data of each operation, in order.
+        """
+        responses = await self._post_batch(
+            [
+                (query, None, self._process_variables(variables)[0])
+                for query, variables in operations
+            ]
+        )
+        return [self.get_data(response) for response in responses]
+
+    async def _post_batch(
+        self, operations: list[tuple[str, str | None, dict[str, Any]]]
+    ) -> list[httpx.Response]:
+        """POST operations as one array body, falling back to single requests."""
+        if len(operations) > 1 and self._batching_supported is not False:
+            response = await self.http_client.post(
+                url=self.url,
+                content=json.dumps(
+                    [
+                        {
+                            "query": query,
+                            "operationName": operation_name,
+                            "variables": variables,
+                        }
+                        for query, operation_name, variables in operations
+                    ],
+                    default=to_jsonable_python,
+                ),
+                headers={"Content-Type": "application/json"},
+            )
+            try:
+                results = response.json()
+            except ValueError:
+                results = None
+
+            if isinstance(results, list) and len(results) == len(operations):
+                self._batching_supported = True
+                # Split into per-operation responses for get_data()
+                return [
+                    httpx.Response(
+                        response.status_code, json=result, request=response.request
+                    )
+                    for result in results
+                ]
+            if response.status_code not in _BATCH_REJECTED_STATUS_CODES or isinstance(
+                results, list
+            ):
+                # The batch may have been executed: don't send it again
+                self.get_data(response)
+                raise GraphQLClientInvalidResponseError(response=response)
+            # Array bodies are not accepted, nothing was executed
+            self._batching_supported = False
+
+        return list(
+            await asyncio.gather(
+                *[
+                    super(PuzzleClient, self)._execute_json(
+                        query=query, operation_name=operation_name, variables=variables
+                    )
+                    for query, operation_name, variables in operations
                 ]
             )
+        )
+
+    async def _execute_json(
+        self,
+        query: str,
+        operation_name: str | None,
+        variables: dict[str, Any],
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """Queue the query for the next batch when batch_window is set."""
+        if self.batch_window is None or kwargs:
+            return await super()._execute_json(
+                query=query,
+                operation_name=operation_name,
+                variables=variables,
+                **kwargs,
+            )
+
+        future: asyncio.Future[httpx.Response] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._batch_pending.append(((query, operation_name, variables), future))
+        if self._batch_flush_task is None:
+            self._batch_flush_task = asyncio.create_task(self._flush_batch())
+        return await future
+
+    async def _flush_batch(self) -> None:
+        """Send the queries collected during batch_window as one request."""
+        await asyncio.sleep(self.batch_window or 0)
+        pending, self._batch_pending = self._batch_pending, []
+        self._batch_flush_task = None
+
+        try:
+            responses = await self._post_batch([operation for operation, _ in pending])
+        except Exception as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for (_, future), response in zip(pending, responses):
+                if not future.done():
+                    future.set_result(response)
+
+    @classmethod
+    def _get_ws_connect(cls) -> Any:
+        """
+        Look up websockets.connect on first use.
+
+        This gives subscriptions a clear ImportError when websockets is not
+        installed, while HTTP-only code paths (login, queries) keep working.
+        It doesn't save startup time: the generated base client already
+        imports websockets whenever it is installed.
+        """
+        if cls._ws_connect is None:
+            try:
+                from websockets import connect as ws_connect
+            except ImportError:
+                raise ImportError(
+                    "Subscriptions require 'websockets' package. Install with: pip install websockets"
+                )
+            cls._ws_connect = ws_connect
+        return cls._ws_connect
+
+    async def _track_cookie_changes(self, response: httpx.Response) -> None:
+        """Invalidate the memoized Cookie header when a response sets cookies."""
+        if "set-cookie" in response.headers:
+            self._cookie_version += 1
+
+    def cookies_changed(self) -> None:
+        """
+        Rebuild the WebSocket Cookie header on the next handshake.
+
+        Call this after changing http_client.cookies in place (e.g. with
+        cookies.set()); cookies set by HTTP responses are tracked automatically.
+        """
+        self._cookie_version += 1
+
+    def _cookie_header_cached(self) -> str:
+        """
+        Build the Cookie header from the HTTP client session cookies.
+
+        The header is rebuilt only when the cookie jar changes, so reconnects
+        reuse the string formatted for the previous handshake. Changes are
+        detected in O(1), without walking the jar: a replaced jar, or an HTTP
+        response that set cookies. Cookies changed in place otherwise are
+        only picked up after cookies_changed().
+        """
+        jar = self.http_client.cookies.jar
+        key = (jar, self._cookie_version)
+        if key != self._cookie_header_key:
+            self._cookie_header_key = key
+            self._cookie_header = "; ".join(
+                [f"{cookie.name}={cookie.value}" for cookie in jar]
+            )
+        return self._cookie_header
+
+    async def _ensure_ws(
+        self,
+        subscribe: Callable[["ClientConnection"], Awaitable[None]] | None = None,
+        **kwargs: Any,
+    ) -> tuple["ClientConnection", bool]:
+        """
+        Return the shared WebSocket connection, opening it on first use.
+
+        The TLS/WebSocket handshake and the connection_init/CONNECTION_ACK round
+        trip are paid once per client instead of once per subscription.
+        Connection options in kwargs only take effect when the connection is
+        opened, i.e. for the first subscription.
+
+        With pipeline_subscribe enabled and the connection to be opened,
+        `subscribe` is sent right after connection_init, without waiting for
+        CONNECTION_ACK, which saves a round trip for the first subscription on
+        servers that tolerate it. The graphql-transport-ws spec requires
+        servers to reject a subscribe before the acknowledgment by closing the
+        connection with 4401 Unauthorized; the client then reconnects once and
+        stops pipelining. On such spec-compliant servers the saved round trip
+        becomes one wasted TLS/WebSocket handshake per client, which is why
+        pipelining is off by default. Other close
+        codes are raised. Returns the connection and whether `subscribe` was
+        sent.
+        """
+        async with self._ws_lock:
+            if self._ws is not None:
+                return self._ws, False
+
+            # Import websockets first for a helpful error when it is missing
+            self._get_ws_connect()
+            from websockets import ConnectionClosed
+            from websockets.extensions.permessage_deflate import (
+                ClientPerMessageDeflateFactory,
+            )
+
+            headers = self.ws_headers.copy()
+            headers.update(kwargs.get("extra_headers", {}))
+
+            # Extract cookies from HTTP client and add to WebSocket headers
+            cookie_header = self._cookie_header_cached()
             if cookie_header:
                 headers["Cookie"] = cookie_header
 
-        # Build kwargs for websockets 15.x
-        # Use 'additional_headers' instead of 'extra_headers' for websockets 15.x
-        merged_kwargs: dict[str, Any] = {}
+            # Build kwargs for websockets 15.x
+            # Use 'additional_headers' instead of 'extra_headers' for websockets 15.x
+            merged_kwargs: dict[str, Any] = {}
 
-        if self.ws_origin:
-            merged_kwargs["origin"] = self.ws_origin
+            if self.ws_origin:
+                merged_kwargs["origin"] = self.ws_origin
 
-        if headers:
-            merged_kwargs["additional_headers"] = headers
+            if headers:
+                merged_kwargs["additional_headers"] = headers
 
-        # Pass through any other kwargs except extra_headers (already processed)
-        for key, value in kwargs.items():
-            if key != "extra_headers":
-                merged_kwargs[key] = value
+            # Compress frames with permessage-deflate using full 32 KiB windows:
+            # subscription payloads are repetitive JSON. Servers without the
+            # extension decline it during the handshake.
+            merged_kwargs["extensions"] = [
+                ClientPerMessageDeflateFactory(
+                    client_max_window_bits=15,
+                    server_max_window_bits=15,
+                    compress_settings={"memLevel": 8},
+                )
+            ]
 
-        # Execute the WebSocket subscription
-        operation_id = str(uuid4())
-        async with ws_connect(
+            # Pass through any other kwargs except extra_headers (already processed)
+            for key, value in kwargs.items():
+                if key != "extra_headers":
+                    merged_kwargs[key] = value
+
+            pipelined = subscribe is not None and self._ws_pipelining
+            try:
+                websocket = await self._open_ws(
+                    merged_kwargs, subscribe if pipelined else None
+                )
+            except ConnectionClosed as exc:
+                if not pipelined or exc.rcvd is None or exc.rcvd.code != 4401:
+                    raise
+                # Subscribe before CONNECTION_ACK was rejected
+                self._ws_pipelining = pipelined = False
+                websocket = await self._open_ws(merged_kwargs, None)
+
+            self._ws = websocket
+            self._ws_reader_task = asyncio.create_task(self._ws_reader(websocket))
+            return websocket, pipelined
+
+    async def _open_ws(
+        self,
+        merged_kwargs: dict[str, Any],
+        subscribe: Callable[["ClientConnection"], Awaitable[None]] | None,
+    ) -> "ClientConnection":
+        """Connect and initialize a graphql-transport-ws connection."""
+        ws_connect = self._get_ws_connect()
+        from websockets.typing import Subprotocol
+
+        websocket = await ws_connect(
             self.ws_url,
             subprotocols=[Subprotocol(GRAPHQL_TRANSPORT_WS)],
             **merged_kwargs,
-        ) as websocket:
+        )
+        try:
             # Initialize connection
             await self._send_connection_init(websocket)
 
+            # Pipeline the first subscription behind connection_init
+            if subscribe is not None:
+                await subscribe(websocket)
+
             # Wait for connection acknowledgment
-            await self._handle_ws_message(
-                await websocket.recv(),
-                websocket,
-                expected_type=GraphQLTransportWSMessageType.CONNECTION_ACK,
+            self._expect_connection_ack(await websocket.recv(decode=False))
+        except BaseException:
+            await websocket.close()
+            raise
+        return websocket
+
+    async def _send_subscribe(
+        self,
+        websocket: "ClientConnection",
+        operation_id: str,
+        query: str,
+        operation_name: str | None = None,
+        variables: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Send a subscribe message built from a cached frame template.
+
+        The query text is JSON-encoded once per (query, operation_name);
+        later subscriptions only encode the operation id and the variables.
+        """
+        key = (query, operation_name)
+        template = self._subscribe_template_cache.get(key)
+        if template is None:
+            frame = orjson.dumps(
+                {
+                    "id": "__ID__",
+                    "type": GraphQLTransportWSMessageType.SUBSCRIBE.value,
+                    "payload": {
+                        "query": query,
+                        "operationName": operation_name,
+                        "variables": "__VARS__",
+                    },
+                }
             )
+            head, rest = frame.split(b'"__ID__"', 1)
+            middle, tail = rest.split(b'"__VARS__"', 1)
+            template = self._subscribe_template_cache[key] = (head, middle, tail)
+
+        head, middle, tail = template
+        await websocket.send(
+            b"".join(
+                [
+                    head,
+                    orjson.dumps(operation_id),
+                    middle,
+                    orjson.dumps(
+                        self._convert_dict_to_json_serializable(variables or {})
+                    ),
+                    tail,
+                ]
+            ),
+            text=True,
+        )
+
+    @staticmethod
+    async def _send_complete(websocket: "ClientConnection", operation_id: str) -> None:
+        """Send a complete message for the operation, from a pre-serialized frame."""
+        await websocket.send(
+            b"".join(
+                [_COMPLETE_FRAME_HEAD, orjson.dumps(operation_id), _COMPLETE_FRAME_TAIL]
+            ),
+            text=True,
+        )
+
+    @staticmethod
+    def _expect_connection_ack(message: bytes) -> None:
+        """
+        Check that a frame is the server's CONNECTION_ACK.
+
+        Specialized replacement for _handle_ws_message(..., expected_type=...):
+        the usual compact frame is matched byte for byte, anything else is
+        decoded and only its type is checked.
+        """
+        if message == _CONNECTION_ACK_FRAME:
+            return
+
+        try:
+            message_dict = orjson.loads(message)
+        except orjson.JSONDecodeError as exc:
+            raise GraphQLClientInvalidMessageFormat(message=message) from exc
+
+        if (
+            not isinstance(message_dict, dict)
+            or message_dict.get("type") != GraphQLTransportWSMessageType.CONNECTION_ACK
+        ):
+            raise GraphQLClientInvalidMessageFormat(
+                "Invalid message received. Expected: "
+                f"{GraphQLTransportWSMessageType.CONNECTION_ACK.value}"
+            )
+
+    async def _ws_reader(self, websocket: "ClientConnection") -> None:
+        """
+        Read frames from the shared connection and route them by operation id.
+
+        Data goes to the queue registered for the operation, errors are queued
+        as exceptions and `None` marks the end of an operation. When the
+        reader stops, every operation subscribed on this connection is woken
+        up the same way, and the connection is closed if it is still open.
+        """
+        from websockets import ConnectionClosed, ConnectionClosedOK
+
+        error: Exception | None = None
+        closed = False
+        try:
+            while True:
+                # Receive raw bytes: msgspec parses them directly, skipping
+                # the UTF-8 decode websockets would otherwise do per frame
+                message = await websocket.recv(decode=False)
+                if message == _PING_FRAME:
+                    await websocket.send(_PONG_FRAME, text=True)
+                    continue
+
+                # Only the envelope is decoded here; the payload is decoded by
+                # the operation's own decoder, straight into its result type
+                try:
+                    envelope = _ws_message_decoder.decode(message)
+                except msgspec.DecodeError as exc:
+                    raise GraphQLClientInvalidMessageFormat(message=message) from exc
+
+                if envelope.type == GraphQLTransportWSMessageType.PING:
+                    await websocket.send(_PONG_FRAME, text=True)
+                    continue
+                # Everything else routed below belongs to an operation
+                operation_id = envelope.id
+                if operation_id is None:
+                    continue
+
+                # A queue is missing for late frames of an operation whose
+                # consumer has already left; such frames are dropped
+                entry = self._ws_demux.get(operation_id)
+                if entry is None or entry[0] is not websocket:
+                    entry = None
+
+                match envelope.type:
+                    case GraphQLTransportWSMessageType.NEXT if entry is not None:
+                        _, queue, decoder = entry
+                        try:
+                            data = decoder.decode(envelope.payload).data
+                        except msgspec.DecodeError as exc:
+                            invalid = GraphQLClientInvalidMessageFormat(message=message)
+                            invalid.__cause__ = exc
+                            queue.put_nowait(invalid)
+                            continue
+                        if not data:
+                            continue
+                        if queue.qsize() < self.subscription_buffer:
+                            queue.put_nowait(data)
+                            continue
+
+                        # The consumer fell behind: end the operation instead
+                        # of buffering its updates without bound
+                        del self._ws_demux[operation_id]
+                        queue.put_nowait(
+                            SubscriptionOverflowError(
+                                operation_id, self.subscription_buffer
+                            )
+                        )
+                        await self._send_complete(websocket, operation_id)
+                    case GraphQLTransportWSMessageType.ERROR if entry is not None:
+                        entry[1].put_nowait(
+                            GraphQLClientGraphQLMultiError.from_errors_dicts(
+                                errors_dicts=(
+                                    msgspec.json.decode(envelope.payload)
+                                    if envelope.payload
+                                    else []
+                                ),
+                                data=msgspec.json.decode(message),
+                            )
+                        )
+                    case GraphQLTransportWSMessageType.COMPLETE if entry is not None:
+                        entry[1].put_nowait(None)
+        except ConnectionClosedOK:
+            closed = True
+        except ConnectionClosed as exc:
+            closed = True
+            error = exc
+        except Exception as exc:
+            error = exc
+        finally:
+            # Forget the dead connection so the next subscription reconnects
+            if self._ws is websocket:
+                self._ws = None
+                self._ws_reader_task = None
+            for operation_websocket, queue, _ in self._ws_demux.values():
+                if operation_websocket is websocket:
+                    queue.put_nowait(error)
+            # The reader failed on a live connection: don't leak it
+            if not closed:
+                await websocket.close()
+
+    async def execute_ws(
+        self,
+        query: str,
+        operation_name: str | None = None,
+        variables: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Execute a GraphQL subscription over WebSocket with cookie authentication.
+
+        This method overrides the parent's execute_ws to:
+        1. Extract cookies from the HTTP client session
+        2. Include cookies in the WebSocket connection headers
+        3. Use 'additional_headers' parameter for websockets 15.x compatibility
+        4. Multiplex the subscription over the client's shared connection
+        """
+        async for data in self._subscribe(
+            query, operation_name, variables, dict[str, Any], **kwargs
+        ):
+            yield data
+
+    async def execute_ws_struct(
+        self,
+        query: str,
+        struct_type: type[StructT],
+        operation_name: str | None = None,
+        variables: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[StructT]:
+        """
+        Execute a GraphQL subscription, decoding each update into a msgspec Struct.
+
+        The payload bytes of each frame are decoded straight into `struct_type`,
+        without building the intermediate dicts execute_ws() yields.
+        """
+        async for data in self._subscribe(
+            query, operation_name, variables, struct_type, **kwargs
+        ):
+            yield data
+
+    async def _subscribe(
+        self,
+        query: str,
+        operation_name: str | None,
+        variables: dict[str, Any] | None,
+        data_type: Any,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """Run a subscription on the shared connection, decoding data as data_type."""
+        operation_id = str(uuid4())
+        queue: asyncio.Queue[Any | Exception | None] = asyncio.Queue()
+        decoder = _next_payload_decoder(data_type)
+
+        async def subscribe(websocket: "ClientConnection") -> None:
+            # Register the operation before subscribing so no frame is missed
+            self._ws_demux[operation_id] = (websocket, queue, decoder)
 
             # Subscribe to the operation
             await self._send_subscribe(
@@ -135,8 +1031,55 @@ class PuzzleClient(Client):
                 variables=variables,
             )
 
+        websocket: "ClientConnection | None" = None
+        finished = False
+        try:
+            websocket, subscribed = await self._ensure_ws(subscribe, **kwargs)
+            if not subscribed:
+                await subscribe(websocket)
+
             # Yield messages as they arrive
-            async for message in websocket:
-                data = await self._handle_ws_message(message, websocket)
-                if data:
-                    yield data
+            while True:
+                data = await queue.get()
+                if data is None:
+                    finished = True
+                    return
+                if isinstance(data, Exception):
+                    finished = True
+                    raise data
+                yield data
+        finally:
+            self._ws_demux.pop(operation_id, None)
+            # The consumer left early: stop the operation on the server,
+            # keeping the connection open for the other subscriptions
+            if not finished and websocket is not None and self._ws is websocket:
+                from websockets import ConnectionClosed
+
+                with contextlib.suppress(ConnectionClosed):
+                    await self._send_complete(websocket, operation_id)
+
+    async def on_projects_updated_structs(
+        self, **kwargs: Any
+    ) -> AsyncIterator[OnProjectsUpdated]:
+        """Like on_projects_updated(), but yields puzzle_structs.OnProjectsUpdated."""
+        query, operation_name = _generated_subscription(Client.on_projects_updated)
+        async for data in self.execute_ws_struct(
+            query=query,
+            struct_type=OnProjectsUpdated,
+            operation_name=operation_name,
+            **kwargs,
+        ):
+            yield data
+
+    async def on_products_updated_structs(
+        self, **kwargs: Any
+    ) -> AsyncIterator[OnProductsUpdated]:
+        """Like on_products_updated(), but yields puzzle_structs.OnProductsUpdated."""
+        query, operation_name = _generated_subscription(Client.on_products_updated)
+        async for data in self.execute_ws_struct(
+            query=query,
+            struct_type=OnProductsUpdated,
+            operation_name=operation_name,
+            **kwargs,
+        ):
+            yield data
@@ -0,0 +1,45 @@
+"""
+msgspec counterparts of the generated subscription models.
+
+The generated puzzle models are pydantic BaseModels validated field by field
+in Python. These frozen msgspec Structs mirror the same selections and are
+validated in a single C pass, which matters on high-rate subscription streams.
+Keep them in sync with the subscriptions in queries.graphql.
+"""
+
+import msgspec
+
+
+class OnProjectsUpdatedProjectsChanged(msgspec.Struct, frozen=True, rename="camel"):
+    id: str
+    code: str
+    title: str
+    due_date: str | None
+    created_at: str
+    updated_at: str
+    priority: int
+    tags: list[str]
+    done_at: str | None
+
+
+class OnProjectsUpdated(msgspec.Struct, frozen=True, rename="camel"):
+    projects_changed: list[OnProjectsUpdatedProjectsChanged]
+
+
+class OnProductsUpdatedProductsChangedPath(msgspec.Struct, frozen=True, rename="camel"):
+    id: str
+    code: str
+
+
+class OnProductsUpdatedProductsChanged(msgspec.Struct, frozen=True, rename="camel"):
+    project_id: str
+    id: str
+    code: str
+    created_at: str
+    updated_at: str
+    tags: list[str]
+    path: list[OnProductsUpdatedProductsChangedPath]
+
+
+class OnProductsUpdated(msgspec.Struct, frozen=True, rename="camel"):
+    products_changed: list[OnProductsUpdatedProductsChanged]